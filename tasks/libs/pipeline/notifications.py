@@ -1,22 +1,67 @@
 from __future__ import annotations
 
+import io
 import json
 import os
 import pathlib
 import re
 import subprocess
+import tempfile
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 import gitlab
 import yaml
-from gitlab.v4.objects import ProjectJob
+from gitlab.v4.objects import Project, ProjectJob
 from invoke.context import Context
+from requests.adapters import HTTPAdapter
 
 from tasks.libs.ciproviders.gitlab_api import get_gitlab_repo
 from tasks.libs.owners.parsing import read_owners
 from tasks.libs.types.types import FailedJobReason, FailedJobs, Test
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
 
+
+def _read_yaml_map_cache(cache: pathlib.Path, cache_key: str) -> dict[str, str] | None:
+    try:
+        with cache.open(encoding='utf-8') as cache_stream:
+            if cache_stream.readline().rstrip('\n') != cache_key:
+                return None
+            content = json.load(cache_stream)
+    except (OSError, ValueError):
+        return None
+    # A truncated or edited cache can still be valid json, validate it like the yaml content
+    if not isinstance(content, dict) or not all(
+        isinstance(key, str) and isinstance(value, str) for key, value in content.items()
+    ):
+        return None
+    return content
+
+
+def _write_yaml_map_cache(cache: pathlib.Path, cache_key: str, content: dict[str, str]) -> None:
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=cache.parent, prefix=f".{cache.name}.")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as tmp_stream:
+                tmp_stream.write(f"{cache_key}\n")
+                json.dump(content, tmp_stream)
+            # mkstemp creates the file readable by its owner only, the cache can be shared by all users of the checkout
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, cache)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError:
+        # Read-only checkouts simply don't get a cache
+        pass
+
+
+@lru_cache(maxsize=None)
 def load_and_validate(
     file_name: str, default_placeholder: str, default_value: str, relpath: bool = True
 ) -> dict[str, str]:
@@ -25,25 +70,42 @@ def load_and_validate(
     else:
         p = pathlib.Path(file_name)
 
-    result: dict[str, str] = {}
-    with p.open(encoding='utf-8') as file_stream:
-        for key, value in yaml.safe_load(file_stream).items():
-            if not (isinstance(key, str) and isinstance(value, str)):
-                raise ValueError(f"File {file_name} contains a non-string key or value. Key: {key}, Value: {value}")
-            result[key] = default_value if value == default_placeholder else value
-    return result
+    # The validated content is cached as json next to the yaml file, keyed on the yaml file mtime and size
+    stat = p.stat()
+    cache = p.with_suffix(p.suffix + '.cache.json')
+    cache_key = f"{stat.st_mtime_ns}:{stat.st_size}"
+    content = _read_yaml_map_cache(cache, cache_key)
+    if content is None:
+        content = {}
+        with p.open(encoding='utf-8') as file_stream:
+            for key, value in yaml.load(file_stream, Loader=SafeLoader).items():
+                if not (isinstance(key, str) and isinstance(value, str)):
+                    raise ValueError(f"File {file_name} contains a non-string key or value. Key: {key}, Value: {value}")
+                content[key] = value
+        _write_yaml_map_cache(cache, cache_key, content)
+
+    return {key: default_value if value == default_placeholder else value for key, value in content.items()}
 
 
 DATADOG_AGENT_GITHUB_ORG_URL = "https://github.com/DataDog"
 DEFAULT_SLACK_CHANNEL = "#agent-developer-experience"
 DEFAULT_JIRA_PROJECT = "AGNTR"
+# Matches the PR id at the end of a commit title, e.g. "Fix something (#12345)"
+_PR_ID_RE = re.compile(r'\(#([0-9]+)\)$')
+_JSON_DECODER = json.JSONDecoder()
 # Map keys in lowercase
 GITHUB_SLACK_MAP = load_and_validate("github_slack_map.yaml", "DEFAULT_SLACK_CHANNEL", DEFAULT_SLACK_CHANNEL)
 GITHUB_JIRA_MAP = load_and_validate("github_jira_map.yaml", "DEFAULT_JIRA_PROJECT", DEFAULT_JIRA_PROJECT)
 
 
+@lru_cache(maxsize=None)
+def _cached_read_owners(owners_file: str):
+    # The parsed owners are only read downstream, so the same instance can be shared between callers
+    return read_owners(owners_file)
+
+
 def check_for_missing_owners_slack_and_jira(print_missing_teams=True, owners_file=".github/CODEOWNERS"):
-    owners = read_owners(owners_file)
+    owners = _cached_read_owners(owners_file)
     error = False
     for path in owners.paths:
         if not path[2] or path[2][0][0] != "TEAM":
@@ -59,60 +121,95 @@ def check_for_missing_owners_slack_and_jira(print_missing_teams=True, owners_fil
     return error
 
 
-def get_failed_tests(project_name, job: ProjectJob, owners_file=".github/CODEOWNERS"):
-    repo = get_gitlab_repo(project_name)
-    owners = read_owners(owners_file)
+def _fetch_test_output(repo: Project, job_id) -> bytes:
     try:
-        test_output = str(repo.jobs.get(job.id, lazy=True).artifact('test_output.json'), 'utf-8')
+        return repo.jobs.get(job_id, lazy=True).artifact('test_output.json')
     except gitlab.exceptions.GitlabGetError:
-        test_output = ''
+        return b''
+
+
+def _parse_failed_tests(owners, test_output: bytes):
     failed_tests = {}  # type: dict[tuple[str, str], Test]
-    if test_output:
-        for line in test_output.splitlines():
-            json_test = json.loads(line)
-            if 'Test' in json_test:
-                name = json_test['Test']
-                package = json_test['Package']
-                action = json_test["Action"]
-
-                if action == "fail":
-                    # Ignore subtests, only the parent test should be reported for now
-                    # to avoid multiple reports on the same test
-                    # NTH: maybe the Test object should be more flexible to incorporate
-                    # subtests? This would require some postprocessing of the Test objects
-                    # we yield here to merge child Test objects with their parents.
-                    if '/' in name:  # Subtests have a name of the form "Test/Subtest"
-                        continue
-                    failed_tests[(package, name)] = Test(owners, name, package)
-                elif action == "pass" and (package, name) in failed_tests:
-                    print(f"Test {name} from package {package} passed after retry, removing from output")
-                    del failed_tests[(package, name)]
+    # Stream the artifact line by line and only decode lines that can describe a test
+    for line in io.BytesIO(test_output):
+        if b'"Test"' not in line:
+            continue
+        # Same checks as json.loads: surrounding whitespace is allowed, extra data is not
+        text = line.decode('utf-8').strip()
+        json_test, end = _JSON_DECODER.raw_decode(text)
+        if end != len(text):
+            raise json.JSONDecodeError("Extra data", text, end)
+        if 'Test' in json_test:
+            name = json_test['Test']
+            package = json_test['Package']
+            action = json_test["Action"]
+
+            if action == "fail":
+                # Ignore subtests, only the parent test should be reported for now
+                # to avoid multiple reports on the same test
+                # NTH: maybe the Test object should be more flexible to incorporate
+                # subtests? This would require some postprocessing of the Test objects
+                # we yield here to merge child Test objects with their parents.
+                if '/' in name:  # Subtests have a name of the form "Test/Subtest"
+                    continue
+                failed_tests[(package, name)] = Test(owners, name, package)
+            elif action == "pass" and (package, name) in failed_tests:
+                print(f"Test {name} from package {package} passed after retry, removing from output")
+                del failed_tests[(package, name)]
 
     return failed_tests.values()
 
 
+def get_failed_tests(repo: Project, owners, job: ProjectJob):
+    """
+    Returns the failed tests of the given job, the repo and parsed owners are expected to be
+    built once by the caller and shared across jobs.
+    """
+    return _parse_failed_tests(owners, _fetch_test_output(repo, job.id))
+
+
+def get_failed_tests_batch(project_name, jobs: list[ProjectJob], owners_file=".github/CODEOWNERS", max_workers=16):
+    """
+    Returns a list of (job, failed tests) tuples, in the order of the given jobs.
+    The test_output.json artifacts are downloaded concurrently, then parsed sequentially.
+    """
+    repo = get_gitlab_repo(project_name)
+    owners = _cached_read_owners(owners_file)
+    # Allow one connection per worker to be kept alive
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    repo.manager.gitlab.session.mount('https://', adapter)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        test_outputs = list(executor.map(lambda job: _fetch_test_output(repo, job.id), jobs))
+
+    return [
+        (job, _parse_failed_tests(owners, test_output)) for job, test_output in zip(jobs, test_outputs, strict=True)
+    ]
+
+
 def find_job_owners(failed_jobs: FailedJobs, owners_file: str = ".gitlab/JOBOWNERS") -> dict[str, FailedJobs]:
-    owners = read_owners(owners_file)
+    owners = _cached_read_owners(owners_file)
     owners_to_notify = defaultdict(FailedJobs)
     # For e2e test infrastructure errors, notify the agent-e2e-testing team
     for job in failed_jobs.mandatory_infra_job_failures:
         if job.failure_reason == FailedJobReason.E2E_INFRA_FAILURE:
             owners_to_notify["@DataDog/agent-e2e-testing"].add_failed_job(job)
 
-    for job in failed_jobs.all_non_infra_failures():
-        job_owners = owners.of(job.name)
-        # job_owners is a list of tuples containing the type of owner (eg. USERNAME, TEAM) and the name of the owner
+    @lru_cache(maxsize=4096)
+    def teams_of(job_name):
+        # owners.of returns a list of tuples containing the type of owner (eg. USERNAME, TEAM) and the name of the owner
         # eg. [('TEAM', '@DataDog/agent-ci-experience')]
+        return [owner for kind, owner in owners.of(job_name) if kind == "TEAM"]
 
-        for kind, owner in job_owners:
-            if kind == "TEAM":
-                owners_to_notify[owner].add_failed_job(job)
+    for job in failed_jobs.all_non_infra_failures():
+        for owner in teams_of(job.name):
+            owners_to_notify[owner].add_failed_job(job)
 
     return owners_to_notify
 
 
 def get_pr_from_commit(commit_title, project_title) -> tuple[str, str] | None:
-    parsed_pr_id_found = re.search(r'.*\(#([0-9]*)\)$', commit_title)
+    parsed_pr_id_found = _PR_ID_RE.search(commit_title)
     if not parsed_pr_id_found:
         return None
 
@@ -121,16 +218,36 @@ def get_pr_from_commit(commit_title, project_title) -> tuple[str, str] | None:
     return parsed_pr_id, f"{DATADOG_AGENT_GITHUB_ORG_URL}/{project_title}/pull/{parsed_pr_id}"
 
 
+@lru_cache(maxsize=1)
+def _ci_env() -> dict[str, str]:
+    """
+    Snapshot of the CI variables used in the notification messages, they don't change during a run.
+    """
+    return {
+        name: os.getenv(name, "")
+        for name in (
+            "CI_PROJECT_TITLE",
+            "CI_COMMIT_TITLE",
+            "CI_PIPELINE_URL",
+            "CI_PIPELINE_ID",
+            "CI_COMMIT_REF_NAME",
+            "CI_PROJECT_URL",
+            "CI_COMMIT_SHA",
+            "CI_COMMIT_SHORT_SHA",
+        )
+    }
+
+
 def base_message(header, state):
-    project_title = os.getenv("CI_PROJECT_TITLE")
-    # commit_title needs a default string value, otherwise the re.search line below crashes
-    commit_title = os.getenv("CI_COMMIT_TITLE", "")
-    pipeline_url = os.getenv("CI_PIPELINE_URL")
-    pipeline_id = os.getenv("CI_PIPELINE_ID")
-    commit_ref_name = os.getenv("CI_COMMIT_REF_NAME")
-    commit_url_gitlab = f"{os.getenv('CI_PROJECT_URL')}/commit/{os.getenv('CI_COMMIT_SHA')}"
-    commit_url_github = f"{DATADOG_AGENT_GITHUB_ORG_URL}/{project_title}/commit/{os.getenv('CI_COMMIT_SHA')}"
-    commit_short_sha = os.getenv("CI_COMMIT_SHORT_SHA")
+    ci_env = _ci_env()
+    project_title = ci_env["CI_PROJECT_TITLE"]
+    commit_title = ci_env["CI_COMMIT_TITLE"]
+    pipeline_url = ci_env["CI_PIPELINE_URL"]
+    pipeline_id = ci_env["CI_PIPELINE_ID"]
+    commit_ref_name = ci_env["CI_COMMIT_REF_NAME"]
+    commit_url_gitlab = f"{ci_env['CI_PROJECT_URL']}/commit/{ci_env['CI_COMMIT_SHA']}"
+    commit_url_github = f"{DATADOG_AGENT_GITHUB_ORG_URL}/{project_title}/commit/{ci_env['CI_COMMIT_SHA']}"
+    commit_short_sha = ci_env["CI_COMMIT_SHORT_SHA"]
     author = get_git_author()
 
     # Try to find a PR id (e.g #12345) in the commit title and add a link to it in the message if found.
@@ -144,15 +261,11 @@ def base_message(header, state):
 {enhanced_commit_title} (<{commit_url_gitlab}|{commit_short_sha}>)(:github: <{commit_url_github}|link>) by {author}"""
 
 
-def get_git_author(email=False):
+@lru_cache(maxsize=2)
+def get_git_author(email: bool = False) -> str:
     format = 'ae' if email else 'an'
 
-    return (
-        subprocess.check_output(["git", "show", "-s", f"--format='%{format}'", "HEAD"])
-        .decode('utf-8')
-        .strip()
-        .replace("'", "")
-    )
+    return subprocess.check_output(["git", "show", "-s", f"--format=%{format}", "HEAD"], encoding="utf-8").strip()
 
 
 def send_slack_message(recipient, message):
@@ -2,10 +2,13 @@ from __future__ import annotations
 
 import os
 import re
+import subprocess
 import sys
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from glob import glob
-from os.path import dirname, exists, join, relpath
+from os.path import dirname, relpath
 
 from invoke import Exit, task
 
@@ -35,6 +38,28 @@ from tasks.modules import GoModule
 from tasks.test_core import ModuleLintResult, process_input_args, process_module_results, test_core
 from tasks.update_go import _update_go_mods, _update_references
 
+try:
+    # google-re2 matches the ssm call patterns with a linear-time automaton, when available
+    import re2 as ssm_re
+except ImportError:
+    ssm_re = re
+
+# Matches either a raw `aws ssm get-parameter` call or a call to the ssm wrapper script, in a single pass
+_SSM_CALL_RE = ssm_re.compile(
+    r"(?:ssm get-parameter.+--name +(?P<aws>[^ ]+))|(?:aws_ssm_get_wrapper\.(?:sh|ps1) +(?P<wrapper>[^ )]+))"
+)
+_SSM_OWNER_RE = re.compile(r"^[A-Z].*_SSM_(NAME|KEY): (?P<param>[^ ]+) +# +(?P<owner>.+)$")
+
+# Characters forbidden in filenames on windows
+_FORBIDDEN_FILENAME_CHARS_RE = re.compile(rb'[<>:"\\|?*]')
+# Paths which are not subject to the filename length check
+_LONG_FILENAME_ALLOWED_PREFIXES = (
+    b'test/kitchen/',
+    b'tools/windows/DatadogAgentInstaller',
+    b'test/workload-checks',
+    b'test/regression',
+)
+
 
 @task
 def python(ctx):
@@ -82,39 +107,35 @@ def copyrights(ctx, fix=False, dry_run=False, debug=False, only_staged_files=Fal
 
 
 @task
-def filenames(ctx):
+def filenames(_):
     """
     Scan files to ensure there are no filenames too long or containing illegal characters
     """
-    files = ctx.run("git ls-files -z", hide=True).stdout.split("\0")
+    # Filenames are kept as bytes, only the ones reported as errors are decoded
+    files = subprocess.check_output(["git", "ls-files", "-z"]).split(b"\0")
     failure = False
 
-    if sys.platform == 'win32':
-        print("Running on windows, no need to check filenames for illegal characters")
-    else:
+    check_characters = sys.platform != 'win32'
+    if check_characters:
         print("Checking filenames for illegal characters")
-        forbidden_chars = '<>:"\\|?*'
-        for filename in files:
-            if any(char in filename for char in forbidden_chars):
-                print(f"Error: Found illegal character in path {filename}")
-                failure = True
-
+    else:
+        print("Running on windows, no need to check filenames for illegal characters")
     print("Checking filename length")
     # Approximated length of the prefix of the repo during the windows release build
     prefix_length = 160
     # Maximum length supported by the win32 API
     max_length = 255
+    threshold = max_length - prefix_length
     for filename in files:
-        if (
-            not filename.startswith(
-                ('test/kitchen/', 'tools/windows/DatadogAgentInstaller', 'test/workload-checks', 'test/regression')
-            )
-            and prefix_length + len(filename) > max_length
-        ):
-            print(
-                f"Error: path {filename} is too long ({prefix_length + len(filename) - max_length} characters too many)"
-            )
+        if check_characters and _FORBIDDEN_FILENAME_CHARS_RE.search(filename):
+            print(f"Error: Found illegal character in path {filename.decode('utf-8', 'replace')}")
             failure = True
+        # The encoded length is an upper bound of the length in characters
+        if len(filename) > threshold and not filename.startswith(_LONG_FILENAME_ALLOWED_PREFIXES):
+            decoded = filename.decode('utf-8', 'replace')
+            if len(decoded) > threshold:
+                print(f"Error: path {decoded} is too long ({len(decoded) - threshold} characters too many)")
+                failure = True
 
     if failure:
         raise Exit(code=1)
@@ -292,30 +313,31 @@ def list_ssm_parameters(_):
     List all SSM parameters used in the datadog-agent repository.
     """
 
-    ssm_owner = re.compile(r"^[A-Z].*_SSM_(NAME|KEY): (?P<param>[^ ]+) +# +(?P<owner>.+)$")
     ssm_params = defaultdict(list)
     with open(".gitlab-ci.yml") as f:
         for line in f:
-            m = ssm_owner.match(line.strip())
+            if '_SSM_' not in line:
+                continue
+            m = _SSM_OWNER_RE.match(line.strip())
             if m:
                 ssm_params[m.group("owner")].append(m.group("param"))
-    for owner in ssm_params.keys():
+    for owner, params in sorted(ssm_params.items()):
         print(f"Owner:{owner}")
-        for param in ssm_params[owner]:
-            print(f"  - {param}")
+        print('\n'.join(f"  - {param}" for param in params))
 
 
 @task
-def ssm_parameters(ctx):
+def ssm_parameters(_):
     """
     Lint SSM parameters in the datadog-agent repository.
     """
-    lint_folders = [".circleci", ".github", ".gitlab", "tasks", "test"]
-    repo_files = ctx.run("git ls-files", hide="both")
+    lint_folders = (b".circleci", b".github", b".gitlab", b"tasks", b"test")
+    repo_files = subprocess.check_output(["git", "ls-files", "-z"]).split(b"\0")
+    candidates = [filename.decode('utf-8') for filename in repo_files if filename.startswith(lint_folders)]
     error_files = []
-    for filename in repo_files.stdout.split("\n"):
-        if any(filename.startswith(f) for f in lint_folders):
-            matched = is_get_parameter_call(filename)
+    # Files are scanned concurrently to overlap disk reads with the matching
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 4) * 4)) as executor:
+        for matched in executor.map(is_get_parameter_call, candidates):
             if matched:
                 error_files.append(matched)
     if error_files:
@@ -345,24 +367,25 @@ class SSMParameterCall:
 
 
 def is_get_parameter_call(file):
-    ssm_get = re.compile(r"^.+ssm.get.+$")
-    aws_ssm_call = re.compile(r"^.+ssm get-parameter.+--name +(?P<param>[^ ]+).*$")
-    ssm_wrapper_call = re.compile(r"^.+aws_ssm_get_wrapper.(sh|ps1) +(?P<param>[^ )]+).*$")
-    with open(file) as f:
-        try:
-            for nb, line in enumerate(f):
-                is_ssm_get = ssm_get.match(line.strip())
-                if is_ssm_get:
-                    m = aws_ssm_call.match(line.strip())
-                    if m:
-                        return SSMParameterCall(
-                            file, nb, with_wrapper=False, with_env_var=m.group("param").startswith("$")
-                        )
-                    m = ssm_wrapper_call.match(line.strip())
-                    if m and not m.group("param").startswith("$"):
-                        return SSMParameterCall(file, nb, with_wrapper=True, with_env_var=False)
-        except UnicodeDecodeError:
-            pass
+    with open(file, 'rb') as f:
+        data = f.read()
+    # Most files don't reference ssm at all, skip them before decoding
+    if b'ssm' not in data:
+        return None
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+
+    for nb, line in enumerate(text.split('\n')):
+        if 'ssm' not in line:
+            continue
+        # A line can contain several calls, only the first offending one is reported
+        for m in _SSM_CALL_RE.finditer(line):
+            if m.group("aws") is not None:
+                return SSMParameterCall(file, nb, with_wrapper=False, with_env_var=m.group("aws").startswith("$"))
+            if not m.group("wrapper").startswith("$"):
+                return SSMParameterCall(file, nb, with_wrapper=True, with_env_var=False)
 
 
 @task
@@ -377,10 +400,10 @@ def gitlab_ci(_, test="all", custom_context=None):
         all_contexts = get_preset_contexts(test)
     print(f"We will tests {len(all_contexts)} contexts.")
     agent = get_gitlab_repo()
-    for context in all_contexts:
-        print("Test gitlab configuration with context: ", context)
-        config = generate_gitlab_full_configuration(".gitlab-ci.yml", dict(context))
-        res = agent.ci_lint.create({"content": config, "dry_run": True, "include_jobs": True})
+
+    def check_lint_result(context, lint_result):
+        res = lint_result.result()
+        print("Lint result for context: ", context)
         status = color_message("valid", "green") if res.valid else color_message("invalid", "red")
         print(f"Config is {status}")
         if len(res.warnings) > 0:
@@ -389,6 +412,21 @@ def gitlab_ci(_, test="all", custom_context=None):
             print(color_message(f"Errors: {res.errors}", "red"), file=sys.stderr)
             raise Exit(code=1)
 
+    # Each configuration is linted by gitlab while the next one is being generated
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        previous = None
+        for context in all_contexts:
+            print("Test gitlab configuration with context: ", context)
+            config = generate_gitlab_full_configuration(".gitlab-ci.yml", dict(context))
+            lint_result = executor.submit(
+                agent.ci_lint.create, {"content": config, "dry_run": True, "include_jobs": True}
+            )
+            if previous:
+                check_lint_result(*previous)
+            previous = (context, lint_result)
+        if previous:
+            check_lint_result(*previous)
+
 
 @task
 def releasenote(ctx):
@@ -421,6 +459,16 @@ def update_go(_):
     _update_go_mods(warn=False, version="1.2.3", include_otel_modules=True, dry_run=True)
 
 
+_TEST_PATH_PREFIXES = ('test/', './test/', 'test\\', '.\\test\\')
+
+
+def _has_non_test_path(paths):
+    for path in paths:
+        if not path.startswith(_TEST_PATH_PREFIXES):
+            return True
+    return False
+
+
 @task(iterable=['job_files'])
 def test_change_path(_, job_files=None):
     """
@@ -443,14 +491,14 @@ def test_change_path(_, job_files=None):
             return False
 
         # The change paths should be more than just test files
-        return any(
-            not path.startswith(('test/', './test/', 'test\\', '.\\test\\')) for path in rule['changes']['paths']
-        )
+        return _has_non_test_path(rule['changes']['paths'])
+
+    rules_by_test = {test: [rule for rule in config[test]['rules'] if isinstance(rule, dict)] for test, _ in tests}
 
     # Verify that all tests contain a change path rule
     tests_without_change_path = defaultdict(list)
     for test, filepath in tests:
-        if not any(contains_valid_change_rule(rule) for rule in config[test]['rules'] if isinstance(rule, dict)):
+        if not any(contains_valid_change_rule(rule) for rule in rules_by_test[test]):
             tests_without_change_path[filepath].append(test)
 
     if len(tests_without_change_path) != 0:
@@ -477,6 +525,41 @@ EXCLUDED_PACKAGES = {
 GO_TAGS = ["test"]
 
 
+@lru_cache(maxsize=None)
+def _go_module_roots():
+    """
+    Returns the `./`-relative paths of all the go modules of the repository, deepest first.
+    """
+    go_mods = subprocess.check_output(["git", "ls-files", "-z", "--", ":(glob)**/go.mod"], text=True).split("\0")
+    roots = {f'./{dirname(go_mod)}' if dirname(go_mod) else '.' for go_mod in go_mods if go_mod}
+    return sorted(roots, key=len, reverse=True)
+
+
+def _valid_packages_for_module(ctx, module):
+    """
+    Returns the `./`-relative paths of the valid packages of the module, as listed by `go list`.
+    """
+    with ctx.cd(module):
+        # -find skips listing package dependencies
+        # -f {{.Dir}} outputs the absolute dir containing the package
+        res = ctx.run("go list -find -f '{{.Dir}}' ./...", hide=True)
+
+    module_dir = os.path.abspath(module)
+    prefix_length = len(module_dir) + 1
+    valid_packages = set()
+    for line in res.stdout.splitlines():
+        if not line:
+            continue
+        if line == module_dir:
+            valid_packages.add('.')
+        elif line.startswith(f'{module_dir}/'):
+            valid_packages.add(f'./{line[prefix_length:]}')
+        else:
+            relative = relpath(line, module)
+            valid_packages.add(relative if relative == '.' else f'./{relative}')
+    return valid_packages
+
+
 @task
 def go_vet(ctx):
     def go_module_for_package(package_path):
@@ -488,9 +571,11 @@ def go_vet(ctx):
         `.`.
         """
         assert package_path.startswith('./')
-        module_path = package_path
-        while module_path != '.' and not exists(join(module_path, 'go.mod')):
-            module_path = dirname(module_path)
+        module_path = '.'
+        for root in _go_module_roots():
+            if package_path == root or package_path.startswith(f'{root}/'):
+                module_path = root
+                break
         relative_package = relpath(package_path, start=module_path)
         if relative_package != '.' and not relative_package[0].startswith('./'):
             relative_package = f"./{relative_package}"
@@ -524,18 +609,7 @@ def go_vet(ctx):
     # use that to skip packages that do not have any files included, which will
     # otherwise cause go vet to fail.
     for module, packages in by_mod.items():
-        with ctx.cd(module):
-            # -find skips listing package dependencies
-            # -f {{.Dir}} outputs the absolute dir containing the package
-            res = ctx.run("go list -find -f '{{.Dir}}' ./...", hide=True)
-
-        valid_packages = set()
-        for line in res.stdout.splitlines():
-            if line:
-                relative = relpath(line, module)
-                if relative != '.':
-                    relative = f'./{relative}'
-            valid_packages.add(relative)
+        valid_packages = _valid_packages_for_module(ctx, module)
         for package in packages - valid_packages:
             print(f"Skipping {package} in {module}: not a valid package or all files are excluded by build tags")
             packages.remove(package)
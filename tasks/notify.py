@@ -25,7 +25,7 @@ from tasks.libs.pipeline.notifications import (
     check_for_missing_owners_slack_and_jira,
     email_to_slackid,
     find_job_owners,
-    get_failed_tests,
+    get_failed_tests_batch,
     get_git_author,
     get_pr_from_commit,
     send_slack_message,
@@ -326,8 +326,8 @@ def generate_failure_messages(project_name: str, failed_jobs: FailedJobs) -> dic
     failed_job_owners = find_job_owners(failed_jobs)
     for owner, jobs in failed_job_owners.items():
         if owner == "@DataDog/multiple":
-            for job in jobs.all_non_infra_failures():
-                for test in get_failed_tests(project_name, job):
+            for job, tests in get_failed_tests_batch(project_name, jobs.all_non_infra_failures()):
+                for test in tests:
                     messages_to_send[all_teams].add_test_failure(test, job)
                     for owner in test.owners:
                         messages_to_send[owner].add_test_failure(test, job)
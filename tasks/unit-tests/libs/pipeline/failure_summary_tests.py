@@ -1,5 +1,6 @@
 import os
 import shutil
+import tempfile
 from contextlib import contextmanager
 from datetime import timedelta
 from unittest import TestCase
@@ -20,12 +21,15 @@ class TestFailureSummary(TestCase):
     def __init__(self, methodName: str = "runTest") -> None:
         super().__init__(methodName)
 
-        self.github_slack_map = load_and_validate(
-            "tasks/unit-tests/testdata/github_slack_map.yaml",
-            "DEFAULT_SLACK_CHANNEL",
-            '#agent-developer-experience',
-            relpath=False,
-        )
+        # Load a copy so that the map cache is not written to the source tree
+        with tempfile.TemporaryDirectory() as tmpdir:
+            map_file = shutil.copy("tasks/unit-tests/testdata/github_slack_map.yaml", tmpdir)
+            self.github_slack_map = load_and_validate(
+                map_file,
+                "DEFAULT_SLACK_CHANNEL",
+                '#agent-developer-experience',
+                relpath=False,
+            )
 
     def setUp(self) -> None:
         os.makedirs(TEST_DIR, exist_ok=True)
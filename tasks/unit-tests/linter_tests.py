@@ -49,3 +49,38 @@ class TestIsGetParameterCall(unittest.TestCase):
             f.write("export DD_APP_KEY=$($CI_PROJECT_DIR/tools/ci/aws_ssm_get_wrapper.sh $APP_KEY_ORG2_SSM_NAME)")
         matched = linter.is_get_parameter_call(self.test_file)
         self.assertIsNone(matched)
+
+    def test_wrapper_with_env_then_wrapper_no_env(self):
+        with open(self.test_file, "w") as f:
+            f.write(
+                "export A=$($CI_PROJECT_DIR/tools/ci/aws_ssm_get_wrapper.sh $API_KEY_ORG2_SSM_NAME) B=$($CI_PROJECT_DIR/tools/ci/aws_ssm_get_wrapper.sh ci.datadog-agent.datadog_api_key_org2)"
+            )
+        matched = linter.is_get_parameter_call(self.test_file)
+        self.assertTrue(matched.with_wrapper)
+        self.assertFalse(matched.with_env_var)
+
+    def test_wrapper_with_env_then_without_wrapper(self):
+        with open(self.test_file, "w") as f:
+            f.write(
+                "export A=$($CI_PROJECT_DIR/tools/ci/aws_ssm_get_wrapper.sh $API_KEY_ORG2_SSM_NAME) B=$(aws ssm get-parameter --region us-east-1 --name ci.datadog-agent.datadog_api_key_org2 --with-decryption --query Parameter.Value --out text)"
+            )
+        matched = linter.is_get_parameter_call(self.test_file)
+        self.assertFalse(matched.with_wrapper)
+        self.assertFalse(matched.with_env_var)
+
+    def test_undecodable_content(self):
+        with open(self.test_file, "wb") as f:
+            f.write(
+                b"export DD_API_KEY=$($CI_PROJECT_DIR/tools/ci/aws_ssm_get_wrapper.sh ci.datadog-agent.datadog_api_key_org2)\n"
+                b"\xff\xfe ssm\n"
+            )
+        matched = linter.is_get_parameter_call(self.test_file)
+        self.assertIsNone(matched)
+
+    def test_line_number_with_form_feed(self):
+        with open(self.test_file, "w") as f:
+            f.write(
+                "# section\x0c\nexport DD_API_KEY=$($CI_PROJECT_DIR/tools/ci/aws_ssm_get_wrapper.sh ci.datadog-agent.datadog_api_key_org2)"
+            )
+        matched = linter.is_get_parameter_call(self.test_file)
+        self.assertEqual(matched.line_nb, 1)
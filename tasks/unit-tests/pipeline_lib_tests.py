@@ -1,6 +1,12 @@
+import json
+import os
+import shutil
+import stat
+import tempfile
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
+import gitlab
 from gitlab.v4.objects import ProjectJob
 
 from tasks.libs.pipeline import notifications
@@ -18,6 +24,145 @@ class TestLoadAndValidate(unittest.TestCase):
         self.assertEqual(notifications.GITHUB_SLACK_MAP['@datadog/agent-all'], "#datadog-agent-pipelines")
         self.assertEqual(notifications.GITHUB_SLACK_MAP['@datadog/agent-ci-experience'], "#agent-developer-experience")
 
+    def test_files_copy_loaded_correctly(self):
+        # Load copies so that the map caches are not written to the source tree
+        with tempfile.TemporaryDirectory() as tmpdir:
+            jira_map = notifications.load_and_validate(
+                shutil.copy("tasks/libs/pipeline/github_jira_map.yaml", tmpdir),
+                "DEFAULT_JIRA_PROJECT",
+                notifications.DEFAULT_JIRA_PROJECT,
+                relpath=False,
+            )
+            slack_map = notifications.load_and_validate(
+                shutil.copy("tasks/libs/pipeline/github_slack_map.yaml", tmpdir),
+                "DEFAULT_SLACK_CHANNEL",
+                notifications.DEFAULT_SLACK_CHANNEL,
+                relpath=False,
+            )
+
+        self.assertEqual(jira_map['@datadog/agent-all'], "AGNTR")
+        self.assertEqual(jira_map['@datadog/agent-ci-experience'], "ACIX")
+        self.assertEqual(slack_map['@datadog/agent-all'], "#datadog-agent-pipelines")
+        self.assertEqual(slack_map['@datadog/agent-ci-experience'], "#agent-developer-experience")
+
+    def test_cache_file_mode(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            map_file = os.path.join(tmpdir, "map.yaml")
+            with open(map_file, "w") as f:
+                f.write("'@datadog/team-a': '#team-a'\n")
+            notifications.load_and_validate(map_file, "DEFAULT", "#default", relpath=False)
+
+            self.assertEqual(stat.S_IMODE(os.stat(map_file + ".cache.json").st_mode), 0o644)
+
+    def test_non_string_cache_content(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            map_file = os.path.join(tmpdir, "map.yaml")
+            with open(map_file, "w") as f:
+                f.write("'@datadog/team-a': '#team-a'\n")
+            map_stat = os.stat(map_file)
+            with open(map_file + ".cache.json", "w") as f:
+                f.write(f"{map_stat.st_mtime_ns}:{map_stat.st_size}\n" + '{"@datadog/team-a": 1}')
+
+            self.assertEqual(
+                notifications.load_and_validate(map_file, "DEFAULT", "#default", relpath=False),
+                {'@datadog/team-a': "#team-a"},
+            )
+
+    def test_invalid_cache_content(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            map_file = os.path.join(tmpdir, "map.yaml")
+            with open(map_file, "w") as f:
+                f.write("'@datadog/team-a': DEFAULT\n")
+            map_stat = os.stat(map_file)
+            with open(map_file + ".cache.json", "w") as f:
+                f.write(f"{map_stat.st_mtime_ns}:{map_stat.st_size}\n[]")
+
+            self.assertEqual(
+                notifications.load_and_validate(map_file, "DEFAULT", "#default", relpath=False),
+                {'@datadog/team-a': "#default"},
+            )
+
+    def test_cache_invalidated_on_change(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            map_file = os.path.join(tmpdir, "map.yaml")
+            with open(map_file, "w") as f:
+                f.write("'@datadog/team-a': DEFAULT\n")
+            self.assertEqual(
+                notifications.load_and_validate(map_file, "DEFAULT", "#default", relpath=False),
+                {'@datadog/team-a': "#default"},
+            )
+            self.assertTrue(os.path.exists(map_file + ".cache.json"))
+            # Served from the cache
+            with patch("tasks.libs.pipeline.notifications.yaml.load") as yaml_load_mock:
+                self.assertEqual(
+                    notifications.load_and_validate(map_file, "DEFAULT", "#other", relpath=False),
+                    {'@datadog/team-a': "#other"},
+                )
+                yaml_load_mock.assert_not_called()
+
+            with open(map_file, "w") as f:
+                f.write("'@datadog/team-a': '#team-a'\n'@datadog/team-b': DEFAULT\n")
+            notifications.load_and_validate.cache_clear()
+            self.assertEqual(
+                notifications.load_and_validate(map_file, "DEFAULT", "#default", relpath=False),
+                {'@datadog/team-a': "#team-a", '@datadog/team-b': "#default"},
+            )
+
+
+class TestGetFailedTests(unittest.TestCase):
+    def test_only_parent_tests(self):
+        repo = MagicMock()
+        with open("tasks/unit-tests/testdata/test_output_failure_parent.json", "rb") as f:
+            repo.jobs.get.return_value.artifact.return_value = f.read()
+
+        failed_tests = notifications.get_failed_tests(repo, MagicMock(), MagicMock(id=618))
+
+        self.assertEqual(
+            [(test.package, test.name) for test in failed_tests], [("test/new-e2e/tests/containers", "TestEKSSuite")]
+        )
+
+    def test_surrounding_whitespace(self):
+        repo = MagicMock()
+        repo.jobs.get.return_value.artifact.return_value = (
+            b'  {"Action":"fail","Package":"github.com/DataDog/datadog-agent/pkg/gohai","Test":"TestGetPayload"}  \n'
+        )
+
+        failed_tests = notifications.get_failed_tests(repo, MagicMock(), MagicMock(id=618))
+
+        self.assertEqual([(test.package, test.name) for test in failed_tests], [("pkg/gohai", "TestGetPayload")])
+
+    def test_extra_data(self):
+        repo = MagicMock()
+        repo.jobs.get.return_value.artifact.return_value = (
+            b'{"Action":"fail","Package":"github.com/DataDog/datadog-agent/pkg/gohai","Test":"TestGetPayload"} {}\n'
+        )
+
+        with self.assertRaises(json.JSONDecodeError):
+            notifications.get_failed_tests(repo, MagicMock(), MagicMock(id=618))
+
+    def test_no_artifact(self):
+        repo = MagicMock()
+        repo.jobs.get.return_value.artifact.side_effect = gitlab.exceptions.GitlabGetError()
+
+        failed_tests = notifications.get_failed_tests(repo, MagicMock(), MagicMock(id=618))
+
+        self.assertEqual(list(failed_tests), [])
+
+    @patch("tasks.libs.pipeline.notifications.get_gitlab_repo")
+    def test_batch_keeps_job_order(self, repo_mock):
+        with open("tasks/unit-tests/testdata/test_output_failure_parent.json", "rb") as f:
+            test_output = f.read()
+        artifacts = {1: b'', 2: test_output, 3: b''}
+        repo_mock.return_value.jobs.get.side_effect = lambda job_id, lazy: MagicMock(
+            artifact=MagicMock(return_value=artifacts[job_id])
+        )
+        jobs = [MagicMock(id=job_id) for job_id in artifacts]
+
+        failed_tests = notifications.get_failed_tests_batch("DataDog/datadog-agent", jobs)
+
+        self.assertEqual([job for job, _ in failed_tests], jobs)
+        self.assertEqual([len(tests) for _, tests in failed_tests], [0, 1, 0])
+
 
 class TestFailedJobs(unittest.TestCase):
     def test_infra_failure(self):